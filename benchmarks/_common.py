@@ -0,0 +1,95 @@
+"""
+Helpers shared by the benchmark scripts
+
+Importing this module puts the repository root on sys.path, so a script run
+as `python benchmarks/bench_x.py` can import app next. It does not import
+app itself, so a script can still set MEDINTEL_* environment variables
+between the two imports.
+"""
+
+import os
+import socket
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CONSONANTS = 'bcdfghklmnprstvz'
+VOWELS = 'aeiou'
+
+
+def pseudo_word(rng):
+    """A pronounceable nonsense word of two to four syllables"""
+    return ''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4)))
+
+
+def synonym_phrases(symptom_synonyms):
+    """Every phrase of a symptom_synonyms mapping, in order"""
+    return [phrase for values in symptom_synonyms.values() for phrase in values]
+
+
+def make_texts(phrases, count, rng, symptoms=(1, 5)):
+    """Symptom descriptions of the form "I have a, b, c", each listing a
+    number of phrases drawn from the symptoms range"""
+    return ["I have " + ", ".join(rng.sample(phrases, rng.randint(*symptoms))) for _ in range(count)]
+
+
+def synthetic_condition(number, symptoms, template, rng):
+    return {
+        'id': f"synthetic_{number}",
+        'name': f"Synthetic Condition {number}",
+        'symptoms': symptoms,
+        'weights': {s: rng.randint(3, 10) for s in symptoms},
+        'risk_factors': template['risk_factors'],
+        'emergency': rng.random() < 0.05,
+        'severity': rng.choice(['low', 'moderate', 'high']),
+        'prevention': template['prevention'],
+        'recommendations': template['recommendations'],
+    }
+
+
+def make_document(base, rng, condition_count=None, synonym_scale=1):
+    """Knowledge base document padded from base with synthetic data
+
+    With condition_count, synthetic conditions listing four to nine symptoms
+    each are added (or base conditions dropped) until there are exactly that
+    many, with one new canonical symptom per four synthetic conditions.
+    With synonym_scale, new canonical symptoms are then added until there
+    are that many times as many synonym phrases, each listed by a synthetic
+    condition of its own so that it has a weight.
+    """
+    conditions = [dict(c) for c in base['conditions']]
+    synonyms = {k: list(v) for k, v in base['symptom_synonyms'].items()}
+    template = conditions[0]
+    version = base.get('version', 'synthetic')
+
+    if condition_count is not None:
+        extra = max(condition_count - len(conditions), 0)
+        for _ in range(extra // 4):
+            canonical = f"{pseudo_word(rng)} {pseudo_word(rng)}"
+            synonyms[canonical] = [canonical] + [pseudo_word(rng) for _ in range(rng.randint(0, 2))]
+        vocabulary = list(synonyms)
+        for i in range(extra):
+            conditions.append(synthetic_condition(i, rng.sample(vocabulary, rng.randint(4, 9)), template, rng))
+        conditions = conditions[:max(condition_count, 1)]
+        version = f"synthetic-{condition_count}"
+
+    count = len(synonym_phrases(synonyms))
+    target = len(synonym_phrases(base['symptom_synonyms'])) * synonym_scale
+    number = len(conditions)
+    while count < target:
+        canonical = ' '.join(pseudo_word(rng) for _ in range(rng.randint(1, 3)))
+        synonyms[canonical] = [canonical] + [pseudo_word(rng) for _ in range(rng.randint(0, 3))]
+        count += len(synonyms[canonical])
+        conditions.append(synthetic_condition(number, [canonical], template, rng))
+        number += 1
+
+    return dict(base, version=version, conditions=conditions, symptom_synonyms=synonyms)
+
+
+def free_port():
+    """A TCP port on 127.0.0.1 that was free a moment ago"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
@@ -0,0 +1,70 @@
+"""
+Cache memory benchmark
+
+Streams a million unique keys through CacheLayer and reports resident memory
+at regular checkpoints. With bounds in place the numbers stay flat once the
+cache fills; pass --unbounded to run the same stream through a plain dict for
+comparison.
+
+Usage: python benchmarks/bench_cache.py [--keys N] [--unbounded]
+"""
+
+import argparse
+import os
+import time
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import CacheLayer, MemoryCacheBackend  # noqa: E402
+
+VALUE_SIZE = 512
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to peak RSS"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class UnboundedCache:
+    """The original unbounded dict cache"""
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache[key] = (value, time.time())
+
+    def stats(self):
+        return {'entries': len(self.cache)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keys', type=int, default=1_000_000)
+    parser.add_argument('--max-entries', type=int, default=10000)
+    parser.add_argument('--unbounded', action='store_true')
+    args = parser.parse_args()
+
+    cache = UnboundedCache() if args.unbounded else CacheLayer(MemoryCacheBackend(max_entries=args.max_entries))
+    checkpoint = max(args.keys // 10, 1)
+    print(f"{'keys':>10} {'rss MB':>8} {'entries':>8} {'us/op':>7}")
+    start = time.perf_counter()
+    for i in range(1, args.keys + 1):
+        key = f"analyze:{i}"
+        cache.get(key)
+        cache.set(key, os.urandom(VALUE_SIZE // 2).hex().encode())
+        if i % checkpoint == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{i:>10} {rss_mb():>8.1f} {cache.stats()['entries']:>8} {elapsed / i * 1e6:>7.2f}")
+    print(cache.stats())
+
+
+if __name__ == '__main__':
+    main()
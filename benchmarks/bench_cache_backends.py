@@ -0,0 +1,91 @@
+"""
+Cache backend benchmark
+
+Runs the same get-or-set workload in N concurrent worker processes against
+each cache backend and reports hit rate and hit latency. The memory backend
+gives every worker its own cache; the SQLite backend is shared, so one
+worker's misses warm the others.
+
+Usage: python benchmarks/bench_cache_backends.py [--workers 1 2 4 8] [--ops N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import MemoryCacheBackend, SQLiteCacheBackend  # noqa: E402
+
+KEY_SPACE = 2000
+VALUE = (b'{"success":true,"input_analysis":' + b'x' * 4500, b'}\n')
+
+
+def make_backend(name, path):
+    if name == 'memory':
+        return MemoryCacheBackend()
+    return SQLiteCacheBackend(path)
+
+
+def worker(name, path, ops, seed, results):
+    backend = make_backend(name, path)
+    rng = random.Random(seed)
+    hit_latencies = []
+    misses = 0
+    for _ in range(ops):
+        # Skewed key popularity, like real symptom combinations
+        key = f"analyze:{int(rng.paretovariate(0.6)) % KEY_SPACE}"
+        start = time.perf_counter()
+        value = backend.get(key)
+        elapsed = time.perf_counter() - start
+        if value is None:
+            misses += 1
+            backend.set(key, VALUE)
+        else:
+            hit_latencies.append(elapsed)
+    results.put((hit_latencies, misses))
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def run(name, workers, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite3')
+        if name == 'sqlite':
+            SQLiteCacheBackend(path)  # create schema before workers race for it
+        ctx = multiprocessing.get_context('fork')
+        results = ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(name, path, ops, seed, results)) for seed in range(workers)]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    hits = [latency for latencies, _ in collected for latency in latencies]
+    misses = sum(m for _, m in collected)
+    return len(hits) / (len(hits) + misses), percentile(hits, 50) * 1e6, percentile(hits, 99) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--ops', type=int, default=5000, help='operations per worker')
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'workers':>8} {'hit rate':>9} {'p50 us':>8} {'p99 us':>8}")
+    for name in ('memory', 'sqlite'):
+        for workers in args.workers:
+            hit_rate, p50, p99 = run(name, workers, args.ops)
+            print(f"{name:>8} {workers:>8} {hit_rate:>9.1%} {p50:>8.1f} {p99:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compact response benchmark
+
+Builds analyses for a corpus of symptom descriptions in the full shape, the
+compact shape (conditions referenced by id) and compact with only
+risk_assessment selected, and reports the mean encoded size and the time to
+build plus encode each response.
+
+Usage: python benchmarks/bench_compact.py [--texts N]
+"""
+
+import argparse
+import random
+import time
+
+from _common import make_texts, synonym_phrases
+
+import app as medintel  # noqa: E402
+
+SHAPES = [
+    ('full', medintel.FULL_RESPONSE),
+    ('compact', medintel.ResponseOptions(True, None)),
+    ('compact+fields', medintel.ResponseOptions(True, frozenset(['risk_assessment']))),
+]
+
+
+def encode(processed, bundle, options):
+    include_insight = options.fields is None or 'insight' in options.fields
+    response = medintel.build_analysis(processed, bundle, include_insight, compact=options.compact)
+    if options.fields is not None:
+        response = medintel.select_fields(response, options.fields)
+    return medintel.encode_response_template(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--texts', type=int, default=2000)
+    args = parser.parse_args()
+
+    bundle = medintel.kb_manager.current
+    phrases = synonym_phrases(medintel.knowledge_base.symptom_synonyms)
+    texts = make_texts(phrases, args.texts, random.Random(42))
+    processed = [bundle.symptom_processor.process(medintel.InputValidator.validate(t)[1]) for t in texts]
+
+    print(f"{'shape':>15} {'bytes':>8} {'vs full':>8} {'us/response':>12}")
+    baseline = None
+    for name, options in SHAPES:
+        sizes = [sum(len(part) for part in encode(p, bundle, options)) for p in processed]
+        start = time.perf_counter()
+        for p in processed:
+            encode(p, bundle, options)
+        elapsed = (time.perf_counter() - start) / len(processed) * 1e6
+        mean = sum(sizes) / len(sizes)
+        baseline = baseline or mean
+        print(f"{name:>15} {mean:>8.0f} {mean / baseline:>8.0%} {elapsed:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
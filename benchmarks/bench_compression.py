@@ -0,0 +1,97 @@
+"""
+Response compression benchmark
+
+Encodes /analyze responses for a corpus of symptom descriptions in the full
+and compact shapes and, for each content-coding and level, reports the mean
+compressed size against the uncompressed body, the one-off cost of
+compressing a template on a cache miss, the cost of splicing a timestamp
+into the stored compressed template on every hit, and, for comparison, the
+cost of compressing the whole body on every request instead.
+
+zstd and brotli rows appear when those packages are installed; brotli is
+listed as per-request compression only, since its streams cannot be spliced.
+
+Usage: python benchmarks/bench_compression.py [--texts N] [--levels 1 6 9]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+from _common import make_texts, synonym_phrases
+
+import app as medintel  # noqa: E402
+
+SHAPES = [
+    ('full', medintel.FULL_RESPONSE),
+    ('compact', medintel.ResponseOptions(True, None)),
+]
+
+
+def per_item_us(func, items, repeat=3):
+    """Best of several passes, in microseconds per item"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, (time.perf_counter() - start) / len(items) * 1e6)
+    return best
+
+
+def codecs(levels):
+    """(name, encoding, level, whole-body compressor) rows to measure"""
+    rows = [('gzip', 'gzip', level, lambda body, level=level: gzip.compress(body, level, mtime=0))
+            for level in levels]
+    if medintel.zstandard is not None:
+        rows += [('zstd', 'zstd', level,
+                  lambda body, level=level: medintel.zstandard.ZstdCompressor(level=level).compress(body))
+                 for level in (1, 3, 9)]
+    if medintel.brotli is not None:
+        rows += [('br', None, quality, lambda body, quality=quality: medintel.brotli.compress(body, quality=quality))
+                 for quality in (4, 9)]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--texts', type=int, default=500)
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 6, 9], help="gzip levels")
+    args = parser.parse_args()
+
+    bundle = medintel.kb_manager.current
+    phrases = synonym_phrases(medintel.knowledge_base.symptom_synonyms)
+    texts = make_texts(phrases, args.texts, random.Random(42))
+    processed = [bundle.symptom_processor.process(medintel.InputValidator.validate(t)[1]) for t in texts]
+    timestamp = json.dumps("2024-01-01T00:00:00.000000").encode('utf-8')
+
+    print(f"{'shape':>8} {'codec':>6} {'level':>5} {'bytes':>7} {'ratio':>6} "
+          f"{'miss us':>8} {'hit us':>7} {'per-request us':>15}")
+    for shape, options in SHAPES:
+        templates = []
+        for p in processed:
+            response = medintel.build_analysis(p, bundle, compact=options.compact)
+            templates.append(medintel.encode_response_template(response))
+        bodies = [head + timestamp + tail for head, tail in templates]
+        plain = sum(len(b) for b in bodies) / len(bodies)
+        print(f"{shape:>8} {'none':>6} {'-':>5} {plain:>7.0f} {1:>6.0%} {'-':>8} "
+              f"{per_item_us(lambda t: t[0] + timestamp + t[1], templates):>7.2f} {'-':>15}")
+
+        for name, encoding, level, compress_body in codecs(args.levels):
+            whole = per_item_us(compress_body, bodies)
+            if encoding is None:
+                size = sum(len(compress_body(b)) for b in bodies) / len(bodies)
+                print(f"{shape:>8} {name:>6} {level:>5} {size:>7.0f} {size / plain:>6.0%} {'-':>8} {'-':>7} {whole:>15.1f}")
+                continue
+            compressed = [medintel.compress_template(t, encoding, level) for t in templates]
+            size = sum(len(medintel.render_compressed_template(c, timestamp)) for c in compressed) / len(compressed)
+            miss = per_item_us(lambda t: medintel.compress_template(t, encoding, level), templates)
+            hit = per_item_us(lambda c: medintel.render_compressed_template(c, timestamp), compressed)
+            print(f"{shape:>8} {name:>6} {level:>5} {size:>7.0f} {size / plain:>6.0%} "
+                  f"{miss:>8.1f} {hit:>7.2f} {whole:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
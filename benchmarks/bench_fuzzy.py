@@ -0,0 +1,109 @@
+"""
+Typo-tolerant symptom matching benchmark
+
+Pads the built-in knowledge base with pronounceable synthetic synonyms up to
+a multiple of its synonym count, then times SymptomProcessor.process with
+fuzzy matching disabled and enabled on clean descriptions and on the same
+descriptions with one typo (deletion, insertion, substitution or adjacent
+swap, never in the first letter) in each symptom phrase. The word
+correction memo is cleared before every text for the cold column. Also
+reports the index build time and size, how many typo'd symptoms were
+recovered, and how many symptoms fuzzy matching added to the clean texts.
+
+Usage: python benchmarks/bench_fuzzy.py [--scales 1 10] [--texts N]
+"""
+
+import argparse
+import random
+import time
+
+from _common import CONSONANTS, VOWELS, make_document
+
+import app as medintel  # noqa: E402
+
+FILLER = ['i have', 'been', 'feeling', 'since yesterday', 'really bad', 'and', 'also', 'my', 'today', 'with']
+
+
+def typo(word, rng):
+    """One random edit, leaving the first letter alone"""
+    i = rng.randint(1, len(word) - 1)
+    kind = rng.choice(['delete', 'insert', 'substitute', 'swap'])
+    if kind == 'delete':
+        return word[:i] + word[i + 1:]
+    if kind == 'insert':
+        return word[:i] + rng.choice(VOWELS + CONSONANTS) + word[i:]
+    if kind == 'substitute':
+        return word[:i] + rng.choice([c for c in VOWELS + CONSONANTS if c != word[i]]) + word[i + 1:]
+    if i == len(word) - 1:
+        i -= 1
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def make_texts(document, count, rng):
+    """(clean text, text with typos) pairs; typos go in the longest word of
+    each symptom phrase, which must be at least 8 characters"""
+    phrases = [(p, canonical) for canonical, values in document['symptom_synonyms'].items() for p in values
+               if max(len(w) for w in p.split()) >= 8 and "'" not in p]
+    pairs = []
+    for _ in range(count):
+        clean, typed = [], []
+        for _ in range(rng.randint(1, 4)):
+            phrase, _ = rng.choice(phrases)
+            words = phrase.split()
+            longest = max(range(len(words)), key=lambda i: len(words[i]))
+            words[longest] = typo(words[longest], rng)
+            filler = rng.choice(FILLER)
+            clean += [filler, phrase]
+            typed += [filler, ' '.join(words)]
+        pairs.append((' '.join(clean), ' '.join(typed)))
+    return pairs
+
+
+def per_text_us(processor, texts, cold, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            if cold:
+                processor.word_corrections.clear()
+            processor.process(text)
+        best = min(best, (time.perf_counter() - start) / len(texts) * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help="synonym count multipliers")
+    parser.add_argument('--texts', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'synonyms':>8} {'build ms':>9} {'deletes':>8} {'input':>6} {'exact us':>9} "
+          f"{'fuzzy us':>9} {'cold us':>8} {'recovered':>10} {'added':>6}")
+    for scale in args.scales:
+        rng = random.Random(f"42:{scale}")
+        document = make_document(medintel.knowledge_base.document, rng, synonym_scale=scale)
+        kb = medintel.KnowledgeBase(document=document)
+        exact = medintel.SymptomProcessor(kb, fuzzy_max_distance=0)
+        start = time.perf_counter()
+        fuzzy = medintel.SymptomProcessor(kb)
+        build_ms = (time.perf_counter() - start) * 1000
+        synonym_count = sum(len(v) for v in document['symptom_synonyms'].values())
+
+        pairs = make_texts(document, args.texts, rng)
+        clean = [c for c, _ in pairs]
+        typed = [t for _, t in pairs]
+        expected = [set(exact.process(c)['extracted_symptoms']) for c in clean]
+        added = sum(len(set(fuzzy.process(c)['extracted_symptoms']) - e) for c, e in zip(clean, expected))
+        missing = [e - set(exact.process(t)['extracted_symptoms']) for t, e in zip(typed, expected)]
+        recovered = sum(len(m & set(fuzzy.process(t)['extracted_symptoms'])) for t, m in zip(typed, missing))
+        total_missing = max(sum(len(m) for m in missing), 1)
+
+        for name, texts in (('clean', clean), ('typos', typed)):
+            print(f"{synonym_count:>8} {build_ms:>9.1f} {len(fuzzy.fuzzy.deletes):>8} {name:>6} "
+                  f"{per_text_us(exact, texts, False):>9.1f} {per_text_us(fuzzy, texts, False):>9.1f} "
+                  f"{per_text_us(fuzzy, texts, True):>8.1f} "
+                  f"{recovered / total_missing if name == 'typos' else 0:>10.0%} {added if name == 'clean' else 0:>6}")
+
+
+if __name__ == '__main__':
+    main()
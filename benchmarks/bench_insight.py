@@ -0,0 +1,74 @@
+"""
+Insight generation benchmark
+
+Scores a corpus of symptom descriptions against the built-in knowledge base
+and times AIInsightGenerator.generate over the results three ways: with the
+generator's memo and condition fragments cleared before every call, so each
+insight is rendered from scratch; with only the memo cleared, so the
+pre-rendered condition fragments are assembled; and warm, as in steady
+state. Also reports the time to build a generator for the knowledge base.
+
+Usage: python benchmarks/bench_insight.py [--texts N]
+"""
+
+import argparse
+import random
+import time
+
+from _common import make_texts, synonym_phrases
+
+import app as medintel  # noqa: E402
+
+
+def per_item_us(func, items, setup=None, repeat=5):
+    """Best of several passes, in microseconds per item; setup runs untimed
+    before every call"""
+    best = float('inf')
+    for _ in range(repeat):
+        elapsed = 0
+        for item in items:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func(item)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed / len(items) * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--texts', type=int, default=2000)
+    args = parser.parse_args()
+
+    bundle = medintel.kb_manager.current
+    conditions = bundle.knowledge_base.get_conditions()
+    scored = []
+    phrases = (synonym_phrases(medintel.knowledge_base.symptom_synonyms)
+               + synonym_phrases(medintel.SymptomProcessor.EMERGENCY_KEYWORDS))
+    for text in make_texts(phrases, args.texts, random.Random(42), symptoms=(0, 5)):
+        processed = bundle.symptom_processor.process(medintel.InputValidator.validate(text)[1])
+        scored.append((processed, bundle.risk_engine.calculate(processed['extracted_symptoms'], conditions, top_k=5)))
+
+    start = time.perf_counter()
+    generator = medintel.AIInsightGenerator(bundle.knowledge_base)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def generate(item):
+        generator.generate(item[0], item[1], item[0]['emergency_level'])
+
+    def clear_all():
+        generator.insights.clear()
+        generator.fragments.clear()
+
+    keys = {(r[0]['condition_id'], r[0]['score'], r[0]['severity'], tuple(r[0]['matched_symptoms']),
+             p['emergency_level']) for p, r in scored if r}
+    print(f"{len(conditions)} conditions, {len(scored)} texts, {len(keys)} distinct insights, "
+          f"generator built in {build_ms:.2f} ms")
+    print(f"{'mode':>10} {'us/insight':>11}")
+    for mode, setup in (('scratch', clear_all), ('fragments', generator.insights.clear), ('memoized', None)):
+        print(f"{mode:>10} {per_item_us(generate, scored, setup):>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Knowledge base memory and scoring benchmark
+
+Builds synthetic knowledge bases of growing size, serializes each to JSON
+and, as a data file load would, parses it into a KnowledgeBase plus the
+configured risk scoring engine while tracemalloc measures the memory they
+retain. Reports bytes per condition, the load time, and the time to score
+a request's extracted symptoms against the whole knowledge base.
+
+Usage: python benchmarks/bench_kb_memory.py [--conditions 1000 10000 20000] [--requests N]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from _common import make_document
+
+os.environ.setdefault('MEDINTEL_KB_WATCH_INTERVAL', '0')
+
+import app as medintel  # noqa: E402
+
+
+def load(text):
+    kb = medintel.KnowledgeBase(document=json.loads(text))
+    return kb, medintel.create_scoring_engine(medintel.app.config, kb)
+
+
+def retained_bytes(text):
+    """Memory still held by the parsed knowledge base and its engine"""
+    load(text)  # grows process-wide tables, such as interned strings, outside the measurement
+    gc.collect()
+    tracemalloc.start()
+    try:
+        bundle = load(text)
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del bundle
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--conditions', type=int, nargs='+', default=[1000, 10000, 20000])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"engine: {medintel.app.config['SCORING_ENGINE']}")
+    print(f"{'conditions':>10} {'json MB':>8} {'retained MB':>12} {'bytes/cond':>11} {'load ms':>8} {'score us':>9}")
+    for condition_count in args.conditions:
+        rng = random.Random(f"42:{condition_count}")
+        document = make_document(medintel.knowledge_base.document, rng, condition_count)
+        text = json.dumps(document)
+        retained = retained_bytes(text)
+
+        start = time.perf_counter()
+        kb, engine = load(text)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        canonical = list(document['symptom_synonyms'])
+        requests = [rng.sample(canonical, rng.randint(1, 6)) for _ in range(args.requests)]
+        conditions = kb.get_conditions()
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            for symptoms in requests:
+                engine.calculate(symptoms, conditions, top_k=5)
+            best = min(best, (time.perf_counter() - start) / len(requests) * 1e6)
+
+        count = len(conditions)
+        print(f"{count:>10} {len(text) / 1e6:>8.1f} {retained / 1e6:>12.1f} {retained / count:>11.0f} "
+              f"{load_ms:>8.0f} {best:>9.1f}")
+        # Interned strings would otherwise outlive it into the next measurement
+        del kb, engine, conditions
+
+
+if __name__ == '__main__':
+    main()
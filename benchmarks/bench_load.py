@@ -0,0 +1,415 @@
+"""
+End-to-end HTTP load generator
+
+Drives the API over real sockets with a configurable request mix, either
+against a server it starts (the development server, a threaded server, the
+preforked serve.py, or any command given with --server-cmd) or against a
+running one given with --url. Everything stays on localhost.
+
+Clients run in several processes with a number of connections each. Without
+--rate every connection sends its next request as soon as the previous one
+completes (closed loop). With --rate requests are scheduled with Poisson
+arrivals at that total rate and latency is measured from the scheduled time,
+so a server that falls behind is charged for the queueing it causes.
+
+/analyze traffic mixes a small set of repeated inputs (cache hits) with
+random symptom combinations (almost always misses) in --hit-ratio
+proportion. The emergency endpoint is /analyze with inputs that always
+contain a critical keyword, reported separately so its latency can be
+compared with the rest under overload; with emergency traffic in the mix the
+timeline also has emergency and routine (everything else) p99 columns.
+Connections bind round-robin to --ips loopback addresses
+starting at 127.0.0.1, so the rate limiter sees that many clients (at most
+one per connection).
+
+The report has a timeline per --interval (throughput, latency, errors, 429s,
+503s from admission control and server memory as PSS summed over the
+server's process tree) and a summary per endpoint. --json writes the same
+data as JSON.
+
+Usage:
+    python benchmarks/bench_load.py --server prefork --workers 2 --concurrency 32 --duration 30
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000 --server-pid 1234 --rate 500
+    python benchmarks/bench_load.py --server-cmd "python serve.py --bind 127.0.0.1:{port}" --ips 1
+
+Overload with and without admission control (compare the emergency row):
+    MEDINTEL_ADMISSION_CONCURRENCY=2 python benchmarks/bench_load.py --workers 1 --rate 800 \
+        --mix analyze=90,emergency=10 --hit-ratio 0
+"""
+
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from _common import ROOT, free_port
+
+SYMPTOM_PHRASES = [
+    "fever", "cough", "chest pain", "tired", "dizzy", "runny nose", "nausea", "headache",
+    "sore throat", "stomach ache", "diarrhea", "sneezing", "rash", "vomiting", "chills",
+    "body aches", "shortness of breath", "sweating", "itchy", "joint pain", "back pain",
+    "congestion", "blurred vision", "confusion", "bloating",
+]
+HOT_INPUTS = [
+    "I have a fever and cough", "runny nose and sneezing", "headache and nausea",
+    "sore throat with a fever", "stomach ache and diarrhea", "I feel tired and dizzy",
+    "chest pain and sweating", "itchy rash on my arm",
+]
+EMERGENCY_INPUTS = [
+    "crushing chest pain and I can't breathe", "I think I'm having a heart attack",
+    "severe bleeding from my leg", "my father is unconscious", "signs of a stroke, face drooping",
+]
+DEFAULT_MIX = 'analyze=85,conditions=5,health=10'
+BATCH_SIZE = 10
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+def parse_mix(text):
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('analyze', 'emergency', 'batch', 'conditions', 'health'):
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+def analyze_input(rng, hit_ratio):
+    if rng.random() < hit_ratio:
+        return rng.choice(HOT_INPUTS)
+    return "I have " + ", ".join(rng.sample(SYMPTOM_PHRASES, rng.randint(2, 5)))
+
+def make_request(endpoint, rng, hit_ratio):
+    """(method, path, body) for one request to endpoint"""
+    if endpoint == 'analyze':
+        return 'POST', '/analyze', json.dumps({'symptoms': analyze_input(rng, hit_ratio)})
+    if endpoint == 'emergency':
+        symptoms = f"{rng.choice(EMERGENCY_INPUTS)}, {analyze_input(rng, hit_ratio)}"
+        return 'POST', '/analyze', json.dumps({'symptoms': symptoms})
+    if endpoint == 'batch':
+        items = [analyze_input(rng, hit_ratio) for _ in range(BATCH_SIZE)]
+        return 'POST', '/analyze/batch', json.dumps({'items': items})
+    return 'GET', f'/{endpoint}', None
+
+def connection_loop(index, params, started, deadline, records, lock):
+    """One client connection, sending requests until the deadline"""
+    rng = random.Random(f"{params['seed']}:{index}")
+    host, port = params['host'], params['port']
+    source = (f"127.0.0.{1 + index % params['ips']}", 0) if params['ips'] else None
+    names = [name for name, _ in params['mix']]
+    weights = [weight for _, weight in params['mix']]
+    rate = params['rate'] / params['connections'] if params['rate'] else 0
+    conn = None
+    scheduled = time.perf_counter() + (rng.expovariate(rate) if rate else 0)
+    headers = {'Content-Type': 'application/json'}
+
+    while True:
+        now = time.perf_counter()
+        if rate:
+            if scheduled >= deadline:
+                break
+            if scheduled > now:
+                time.sleep(scheduled - now)
+            start = scheduled
+            scheduled += rng.expovariate(rate)
+        else:
+            if now >= deadline:
+                break
+            start = now
+
+        endpoint = rng.choices(names, weights)[0]
+        method, path, body = make_request(endpoint, rng, params['hit_ratio'])
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=30, source_address=source)
+            conn.request(method, path, body, headers if body else {})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            status = 0
+            if conn is not None:
+                conn.close()
+            conn = None
+        end = time.perf_counter()
+        with lock:
+            records.append((end - started, endpoint, status, end - start))
+    if conn is not None:
+        conn.close()
+
+def client_process(first, count, params, started, results):
+    """Run count connections on threads and ship their records to the parent"""
+    records = []
+    lock = threading.Lock()
+    # perf_counter is not comparable across processes, so rebase on wall time
+    start = time.perf_counter() + (started - time.time())
+    deadline = start + params['duration']
+    time.sleep(max(start - time.perf_counter(), 0))
+    threads = [
+        threading.Thread(target=connection_loop, args=(first + i, params, start, deadline, records, lock))
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(records)
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+def server_command(args, port):
+    if args.server_cmd:
+        return shlex.split(args.server_cmd.format(port=port))
+    if args.server == 'prefork':
+        return [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(args.workers), '--threads', str(args.threads)]
+    debug = args.server == 'dev'
+    code = f"import app; app.app.run(debug={debug}, use_reloader=False, threaded=True, host='127.0.0.1', port={port})"
+    return [sys.executable, '-c', code]
+
+def start_server(args):
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault('MEDINTEL_LOG_FILE', '')
+    proc = subprocess.Popen(server_command(args, port), cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc, '127.0.0.1', port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def process_tree(pid):
+    """pid and all of its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+def memory_mb(pid):
+    """Proportional set size of a process tree, so shared pages count once"""
+    total_kb = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/smaps_rollup') as f:
+                for line in f:
+                    if line.startswith('Pss:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+def sample_memory(pid, started, interval, samples, stop):
+    while not stop.is_set():
+        samples.append((time.time() - started, memory_mb(pid)))
+        stop.wait(interval)
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+def summarize(records, duration):
+    latencies = sorted(r[3] for r in records)
+    statuses = [r[2] for r in records]
+    count = len(records)
+    return {
+        'requests': count,
+        'throughput': round(count / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'error_rate': round(sum(1 for s in statuses if s == 0 or (s >= 500 and s != 503)) / count, 4) if count else 0,
+        'rate_limited_rate': round(statuses.count(429) / count, 4) if count else 0,
+        'shed_rate': round(statuses.count(503) / count, 4) if count else 0,
+    }
+
+def build_report(records, memory, params, interval):
+    timeline = []
+    buckets = {}
+    # Requests still in flight at the deadline count towards the last interval
+    last = max(math.ceil(params['duration'] / interval) - 1, 0)
+    for record in records:
+        buckets.setdefault(min(int(record[0] // interval), last), []).append(record)
+    for bucket in range(last + 1):
+        entries = buckets.get(bucket, [])
+        if not entries:
+            continue
+        point = summarize(entries, interval)
+        window = [mb for t, mb in memory if bucket * interval <= t < (bucket + 1) * interval]
+        point['t'] = bucket * interval
+        point['memory_mb'] = round(max(window), 1) if window else None
+        if any(name == 'emergency' for name, _ in params['mix']):
+            emergency = sorted(r[3] for r in entries if r[1] == 'emergency')
+            routine = sorted(r[3] for r in entries if r[1] != 'emergency')
+            point['emergency_p99_ms'] = round(percentile(emergency, 0.99) * 1000, 2)
+            point['routine_p99_ms'] = round(percentile(routine, 0.99) * 1000, 2)
+        timeline.append(point)
+    endpoints = {}
+    for name, _ in params['mix']:
+        entries = [r for r in records if r[1] == name]
+        if entries:
+            endpoints[name] = summarize(entries, params['duration'])
+    report = {
+        'params': {k: v for k, v in params.items() if k not in ('host', 'port')},
+        'total': summarize(records, params['duration']),
+        'endpoints': endpoints,
+        'timeline': timeline,
+    }
+    if memory:
+        report['memory_mb'] = {
+            'start': round(memory[0][1], 1),
+            'peak': round(max(mb for _, mb in memory), 1),
+            'end': round(memory[-1][1], 1),
+        }
+    return report
+
+def print_report(report):
+    split = any('emergency_p99_ms' in point for point in report['timeline'])
+    print(f"{'t':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'429':>7} {'503':>7} {'mem MB':>8}"
+          + (f" {'emerg p99':>10} {'other p99':>10}" if split else ''))
+    for point in report['timeline']:
+        memory = f"{point['memory_mb']:.1f}" if point['memory_mb'] is not None else '-'
+        line = (f"{point['t']:>5.0f} {point['throughput']:>8.0f} {point['p50_ms']:>8.2f} {point['p99_ms']:>8.2f} "
+                f"{point['error_rate']:>7.2%} {point['rate_limited_rate']:>7.2%} {point['shed_rate']:>7.2%} {memory:>8}")
+        if split:
+            line += f" {point['emergency_p99_ms']:>10.2f} {point['routine_p99_ms']:>10.2f}"
+        print(line)
+    print()
+    print(f"{'endpoint':>10} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'errors':>7} {'429':>7} {'503':>7}")
+    for name, stats in list(report['endpoints'].items()) + [('total', report['total'])]:
+        print(f"{name:>10} {stats['requests']:>9} {stats['throughput']:>8.0f} {stats['p50_ms']:>8.2f} "
+              f"{stats['p90_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms'] or 0:>8.2f} "
+              f"{stats['error_rate']:>7.2%} {stats['rate_limited_rate']:>7.2%} {stats['shed_rate']:>7.2%}")
+    if 'memory_mb' in report:
+        memory = report['memory_mb']
+        print(f"\nserver memory (PSS): start {memory['start']:.1f} MB, peak {memory['peak']:.1f} MB, "
+              f"end {memory['end']:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help="target a running server, e.g. http://127.0.0.1:5000")
+    target.add_argument('--server', choices=['dev', 'threaded', 'prefork'], default='prefork',
+                        help="server to start: app.run with debug, app.run threaded, or serve.py")
+    target.add_argument('--server-cmd', help="command starting a server on {port}, run from the repo root")
+    parser.add_argument('--server-pid', type=int, help="pid of the --url server, for memory sampling")
+    parser.add_argument('--workers', type=int, default=2, help="serve.py worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="serve.py threads per worker")
+    parser.add_argument('--concurrency', type=int, default=16, help="open connections")
+    parser.add_argument('--processes', type=int, default=min(os.cpu_count() or 1, 4),
+                        help="client processes the connections are spread over")
+    parser.add_argument('--rate', type=float, default=0, help="total requests/s with Poisson arrivals (0: closed loop)")
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"endpoint weights (default: {DEFAULT_MIX}; also: emergency, batch)")
+    parser.add_argument('--hit-ratio', type=float, default=0.8, help="share of /analyze inputs that repeat")
+    parser.add_argument('--ips', type=int, default=64, help="distinct loopback source addresses (1-254)")
+    parser.add_argument('--interval', type=float, default=1.0, help="timeline and memory sampling interval")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', metavar='PATH', help="also write the report as JSON")
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+        pid = args.server_pid
+    else:
+        proc, host, port = start_server(args)
+        pid = proc.pid
+
+    params = {
+        'host': host,
+        'port': port,
+        'server': 'url' if args.url else ('custom' if args.server_cmd else args.server),
+        'connections': args.concurrency,
+        'rate': args.rate,
+        'duration': args.duration,
+        'mix': args.mix,
+        'hit_ratio': args.hit_ratio,
+        'ips': max(0, min(args.ips, 254)),
+        'seed': args.seed,
+    }
+
+    memory = []
+    stop = threading.Event()
+    started = time.time() + 0.5  # let every client process start first
+    if pid:
+        threading.Thread(target=sample_memory, args=(pid, started, args.interval, memory, stop), daemon=True).start()
+
+    try:
+        results = multiprocessing.Queue()
+        processes = []
+        share, extra = divmod(args.concurrency, max(args.processes, 1))
+        first = 0
+        for i in range(max(args.processes, 1)):
+            count = share + (1 if i < extra else 0)
+            if not count:
+                continue
+            p = multiprocessing.Process(target=client_process, args=(first, count, params, started, results))
+            p.start()
+            processes.append(p)
+            first += count
+        time.sleep(max(started - time.time(), 0))
+        records = [record for _ in processes for record in results.get()]
+        for p in processes:
+            p.join()
+    finally:
+        stop.set()
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=15)
+
+    report = build_report(records, memory, params, args.interval)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Symptom matcher benchmark
+
+Compares the compiled SymptomMatcher against the original nested substring scan
+as the number of synonyms grows. The generated texts average about 250
+characters, longer than typical input, which puts the crossover near the
+built-in knowledge base's size: at 130 synonyms the two scans are roughly
+even (0.7x-1.0x), while on one-line inputs the compiled matcher is about 3x
+faster there.
+
+Usage: python benchmarks/bench_matcher.py
+"""
+
+import random
+import string
+import time
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import knowledge_base, SymptomProcessor  # noqa: E402
+
+SYNONYM_COUNTS = [130, 1000, 5000, 20000]
+TEXT_COUNT = 200
+REPEAT = 3
+
+
+class SyntheticKnowledgeBase:
+    """Built-in synonyms padded with random phrases up to a target count"""
+    
+    def __init__(self, synonym_count, rng):
+        self.symptom_synonyms = {k: list(v) for k, v in knowledge_base.symptom_synonyms.items()}
+        current = sum(len(v) for v in self.symptom_synonyms.values())
+        index = 0
+        while current < synonym_count:
+            words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+                     for _ in range(rng.randint(1, 3))]
+            self.symptom_synonyms.setdefault(f"synthetic {index // 5}", []).append(' '.join(words))
+            current += 1
+            index += 1
+
+
+def naive_scan(processor, text):
+    """The original per-synonym substring scan"""
+    extracted = []
+    for canonical, synonyms in processor.kb.symptom_synonyms.items():
+        for synonym in synonyms:
+            if synonym in text:
+                if canonical not in extracted:
+                    extracted.append(canonical)
+                break
+    emergency = 'none'
+    for level in ('critical', 'urgent'):
+        if any(keyword in text for keyword in processor.EMERGENCY_KEYWORDS[level]):
+            emergency = level
+            break
+    return extracted, emergency
+
+
+def compiled_scan(processor, text):
+    hits = processor.matcher.scan(text)
+    return processor._extract_symptoms(text, hits), processor._detect_emergency(text, hits)
+
+
+def make_texts(kb, rng):
+    synonyms = [s for v in kb.symptom_synonyms.values() for s in v]
+    filler = ['i have', 'and', 'since yesterday', 'really bad', 'my', 'feel', 'also']
+    texts = []
+    for _ in range(TEXT_COUNT):
+        parts = [rng.choice(synonyms + filler) for _ in range(rng.randint(3, 30))]
+        texts.append(' '.join(parts)[:500].lower())
+    return texts
+
+
+def time_per_call(fn, processor, texts):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for text in texts:
+            fn(processor, text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'synonyms':>10} {'build ms':>10} {'naive us':>10} {'compiled us':>12} {'speedup':>8}")
+    for count in SYNONYM_COUNTS:
+        kb = SyntheticKnowledgeBase(count, rng)
+        start = time.perf_counter()
+        processor = SymptomProcessor(kb, fuzzy_max_distance=0)
+        build_ms = (time.perf_counter() - start) * 1000
+        texts = make_texts(kb, rng)
+        for text in texts:
+            assert naive_scan(processor, text) == compiled_scan(processor, text), text
+        naive_us = time_per_call(naive_scan, processor, texts)
+        compiled_us = time_per_call(compiled_scan, processor, texts)
+        print(f"{count:>10} {build_ms:>10.1f} {naive_us:>10.1f} {compiled_us:>12.1f} {naive_us / compiled_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
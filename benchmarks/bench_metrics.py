@@ -0,0 +1,92 @@
+"""
+Metrics instrumentation overhead benchmark
+
+Replays the instrumentation one /analyze request performs on a cache miss
+(the stage timers, the emergency level and cache counters) against an
+in-memory registry and a file-backed one, and reports the best cost per
+request in microseconds next to the cost of the bare timer calls. Also
+times rendering /metrics with the files of several workers present, each
+with a shard file per request thread.
+
+Usage: python benchmarks/bench_metrics.py [--requests N] [--workers N] [--threads N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import MetricsRegistry, STAGE_BUCKETS, ANALYSIS_STAGES  # noqa: E402
+
+
+def build_registry():
+    registry = MetricsRegistry()
+    stages = registry.histogram('stage_seconds', "Stage time.", STAGE_BUCKETS,
+                                label='stage', label_values=ANALYSIS_STAGES)
+    lookups = registry.counter('cache_lookups_total', "Cache lookups.", label='result', label_values=('hit', 'miss'))
+    levels = registry.counter('emergency_level_total', "Emergency levels.",
+                              label='level', label_values=('none', 'urgent', 'critical'))
+    return registry, stages, lookups, levels
+
+
+def instrumented_request(stages, lookups, levels, perf_counter=time.perf_counter):
+    for stage in ANALYSIS_STAGES:
+        start = perf_counter()
+        stages[stage].observe(perf_counter() - start)
+    levels['none'].inc()
+    lookups['miss'].inc()
+
+
+def bare_request(perf_counter=time.perf_counter):
+    for stage in ANALYSIS_STAGES:
+        start = perf_counter()
+        perf_counter() - start
+
+
+def time_requests(requests, func, *args, repeat=5):
+    """Best of several runs, in microseconds per request"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(requests):
+            func(*args)
+        best = min(best, (time.perf_counter() - start) / requests * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--workers', type=int, default=8, help="workers whose files the exposition sums")
+    parser.add_argument('--threads', type=int, default=8, help="request threads per worker")
+    args = parser.parse_args()
+
+    registry, stages, lookups, levels = build_registry()
+    print(f"timers only:          {time_requests(args.requests, bare_request):.2f} us/request")
+    print(f"in-memory registry:   {time_requests(args.requests, instrumented_request, stages, lookups, levels):.2f} us/request")
+
+    with tempfile.TemporaryDirectory() as directory:
+        registry.use_directory(directory, clear=True)
+        print(f"file-backed registry: {time_requests(args.requests, instrumented_request, stages, lookups, levels):.2f} us/request")
+
+        # Stand-in files for this worker's other threads and for the other workers
+        data = open(registry.path, 'rb').read()
+        names = [f"{MetricsRegistry.FILE_PREFIX}{os.getpid()}.{number}.bin" for number in range(2, args.threads + 1)]
+        for worker in range(args.workers - 1):
+            names.append(f"{MetricsRegistry.FILE_PREFIX}{worker}.bin")
+            names.extend(f"{MetricsRegistry.FILE_PREFIX}{worker}.{number}.bin" for number in range(1, args.threads + 1))
+        for name in names:
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(data)
+        rounds = 200
+        start = time.perf_counter()
+        for _ in range(rounds):
+            registry.exposition()
+        elapsed = (time.perf_counter() - start) / rounds * 1000
+        print(f"/metrics with {args.workers} workers x {args.threads} threads: {elapsed:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Rate limiter benchmark
+
+Sends traffic from 100k distinct IPs (plus a few hot ones) through the
+original list-based limiter and the GCRA limiters, reporting per-call cost
+and how many keys each one retains.
+
+Usage: python benchmarks/bench_rate_limiter.py [--ips N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import RateLimiter, SQLiteRateLimiter  # noqa: E402
+
+
+class ListRateLimiter:
+    """The original sliding-window limiter"""
+    def __init__(self, max_requests=30, window=60):
+        self.max_requests = max_requests
+        self.window = window
+        self.requests = defaultdict(list)
+
+    def is_allowed(self, ip):
+        now = time.time()
+        self.requests[ip] = [t for t in self.requests[ip] if now - t < self.window]
+        if len(self.requests[ip]) >= self.max_requests:
+            return False
+        self.requests[ip].append(now)
+        return True
+
+    def __len__(self):
+        return len(self.requests)
+
+
+def make_traffic(ip_count, rng):
+    """Every IP once, interleaved with a few hot IPs hammering the service"""
+    traffic = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ip_count)]
+    traffic += [f"192.168.0.{rng.randint(1, 4)}" for _ in range(ip_count)]
+    rng.shuffle(traffic)
+    return traffic
+
+
+def run(limiter, traffic):
+    start = time.perf_counter()
+    allowed = sum(limiter.is_allowed(ip) for ip in traffic)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(traffic) * 1e6, allowed, len(limiter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ips', type=int, default=100_000)
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.ips, random.Random(42))
+    with tempfile.TemporaryDirectory() as tmp:
+        limiters = [
+            ('list (original)', ListRateLimiter()),
+            ('gcra memory', RateLimiter()),
+            ('gcra memory 10k keys', RateLimiter(max_keys=10000)),
+            ('gcra sqlite', SQLiteRateLimiter(os.path.join(tmp, 'limits.sqlite3'))),
+        ]
+        print(f"{'limiter':>22} {'us/call':>8} {'allowed':>8} {'keys kept':>10}")
+        for name, limiter in limiters:
+            us, allowed, keys = run(limiter, traffic)
+            print(f"{name:>22} {us:>8.2f} {allowed:>8} {keys:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Risk scoring benchmark
+
+Compares the inverted-index top-k RiskScoringEngine against scoring every
+condition and sorting the full list, for growing knowledge base sizes.
+
+Usage: python benchmarks/bench_scoring.py
+"""
+
+import random
+import time
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import knowledge_base, condition_records, RiskScoringEngine  # noqa: E402
+
+CONDITION_COUNTS = [15, 1000, 5000]
+VOCABULARY_SIZE = 2000
+REQUEST_COUNT = 500
+TOP_K = 5
+
+
+def make_conditions(count, rng):
+    """Built-in conditions plus synthetic ones over a shared symptom vocabulary"""
+    conditions = list(knowledge_base.get_conditions())
+    builtin = sorted({s for c in conditions for s in c['symptoms']})
+    vocabulary = builtin + [f"symptom {i}" for i in range(VOCABULARY_SIZE)]
+    base = conditions[0]
+    for i in range(count - len(conditions)):
+        symptoms = rng.sample(vocabulary, rng.randint(5, 10))
+        conditions.append({
+            'id': f"synthetic_{i}",
+            'name': f"Synthetic Condition {i}",
+            'symptoms': symptoms,
+            'weights': {s: rng.randint(3, 10) for s in symptoms},
+            'emergency': False,
+            'severity': 'moderate',
+            'prevention': base['prevention'],
+            'recommendations': base['recommendations'],
+        })
+    return conditions[:max(count, 1)], vocabulary
+
+
+def full_scan(engine, symptoms, records, vocabulary):
+    """Score every condition record and sort, as the engine did before indexing"""
+    symptom_ids = vocabulary.lookup(symptoms)
+    results = []
+    for condition in records:
+        match_mask = condition.match_mask(symptom_ids)
+        matched_weight = sum(weight for bit, weight in enumerate(condition.weights) if match_mask >> bit & 1)
+        score = engine._score(matched_weight, condition.total_weight, match_mask.bit_count())
+        result = engine._build_result(condition, match_mask, score)
+        if result['match_count'] > 0:
+            results.append(result)
+    results.sort(key=lambda x: x['score'], reverse=True)
+    return results[:TOP_K]
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'conditions':>10} {'full scan us':>13} {'indexed us':>11} {'speedup':>8}")
+    for count in CONDITION_COUNTS:
+        conditions, vocabulary = make_conditions(count, rng)
+        engine = RiskScoringEngine()
+        engine.index = engine._get_index(conditions)
+        # Compiled once, so the full scan times scoring rather than record construction
+        records, symptom_vocabulary = condition_records(conditions)
+        requests = [rng.sample(vocabulary[:200], rng.randint(1, 6)) for _ in range(REQUEST_COUNT)]
+        for symptoms in requests:
+            assert full_scan(engine, symptoms, records, symptom_vocabulary) == engine.calculate(symptoms, top_k=TOP_K)
+
+        start = time.perf_counter()
+        for symptoms in requests:
+            full_scan(engine, symptoms, records, symptom_vocabulary)
+        full_us = (time.perf_counter() - start) / REQUEST_COUNT * 1e6
+
+        start = time.perf_counter()
+        for symptoms in requests:
+            engine.calculate(symptoms, top_k=TOP_K)
+        indexed_us = (time.perf_counter() - start) / REQUEST_COUNT * 1e6
+
+        print(f"{count:>10} {full_us:>13.1f} {indexed_us:>11.1f} {full_us / indexed_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
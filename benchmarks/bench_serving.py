@@ -0,0 +1,122 @@
+"""
+Serving throughput benchmark
+
+Starts the application under the development entry point (app.run with
+debug on, as `python app.py` does) and under serve.py with a growing number of
+preforked workers, drives POST /analyze from several client processes and
+reports requests per second and latency percentiles for each.
+
+Rate limiting is lifted for the server processes so the numbers measure the
+serving path, not the limiter.
+
+Usage: python benchmarks/bench_serving.py [--workers 1 2 4] [--duration 10] [--clients 8]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+from _common import ROOT, free_port
+
+SYMPTOMS = [
+    "fever", "cough", "chest pain", "tired", "dizzy", "runny nose", "nausea",
+    "headache", "sore throat", "stomach ache", "diarrhea", "sneezing", "rash",
+]
+
+
+def start_server(mode, port, workers):
+    env = dict(os.environ, MEDINTEL_RATE_LIMIT_MAX_REQUESTS='1000000000', MEDINTEL_KB_WATCH_INTERVAL='0')
+    if mode == 'dev':
+        code = f"import app; app.app.run(debug=True, use_reloader=False, host='127.0.0.1', port={port})"
+        cmd = [sys.executable, '-c', code]
+    else:
+        cmd = [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def client(port, duration, seed, results):
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        body = json.dumps({'symptoms': ' and '.join(rng.sample(SYMPTOMS, rng.randint(1, 4)))})
+        start = time.perf_counter()
+        try:
+            conn.request('POST', '/analyze', body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            if response.will_close:
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+def drive(port, clients, duration):
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(port, duration, seed, results)) for seed in range(clients)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    latencies = sorted(l for ls, _ in collected for l in ls)
+    errors = sum(e for _, e in collected)
+    if not latencies:
+        return 0, float('nan'), float('nan'), errors
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000
+    return len(latencies) / duration, p50, p99, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'server':>14} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    runs = [('dev', 1)] + [('prefork', w) for w in args.workers]
+    for mode, workers in runs:
+        port = free_port()
+        proc = start_server(mode, port, workers)
+        try:
+            rps, p50, p99, errors = drive(port, args.clients, args.duration)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        label = 'app.run debug' if mode == 'dev' else f'serve.py x{workers}'
+        print(f"{label:>14} {rps:>8.0f} {p50:>8.2f} {p99:>8.2f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Streaming analysis latency benchmark
+
+Serves the app from a local threaded Werkzeug server and, for a corpus of
+symptom descriptions, measures over real HTTP connections the time until
+the emergency level arrives from /analyze/stream (its first event), until
+the stream completes, and until a whole uncached /analyze response arrives.
+
+Usage: python benchmarks/bench_stream.py [--requests N] [--conditions N]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from _common import make_texts, synonym_phrases
+
+os.environ.setdefault('MEDINTEL_RATE_LIMIT_MAX_REQUESTS', '1000000000')
+os.environ.setdefault('MEDINTEL_KB_WATCH_INTERVAL', '0')
+
+from werkzeug.serving import make_server  # noqa: E402
+
+import app as medintel  # noqa: E402
+
+
+def pad_knowledge_base(condition_count, rng):
+    """Clone built-in conditions so scoring and insight take a realistic share"""
+    base = medintel.knowledge_base.document
+    conditions = list(base['conditions'])
+    while len(conditions) < condition_count:
+        template = rng.choice(base['conditions'])
+        conditions.append(dict(template, id=f"{template['id']}_{len(conditions)}"))
+    kb = medintel.KnowledgeBase(document=dict(base, conditions=conditions))
+    return medintel.KnowledgeBundle(kb, medintel.SymptomProcessor(kb),
+                                    medintel.create_scoring_engine(medintel.app.config, kb))
+
+
+def timed_post(port, path, text):
+    """(seconds to the first body line, seconds to the end of the body)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    body = json.dumps({'symptoms': text})
+    start = time.perf_counter()
+    connection.request('POST', path, body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.readline()
+    first = time.perf_counter() - start
+    response.read()
+    total = time.perf_counter() - start
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f"{path} returned {response.status}")
+    return first, total
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--conditions', type=int, default=2000, help="knowledge base size (default: 2000)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    if args.conditions > len(medintel.knowledge_base.get_conditions()):
+        medintel.kb_manager.current = pad_knowledge_base(args.conditions, rng)
+    phrases = synonym_phrases(medintel.knowledge_base.symptom_synonyms)
+    texts = make_texts(phrases, args.requests, rng, symptoms=(1, 6))
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, medintel.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    try:
+        for text in texts[:20]:
+            timed_post(port, '/analyze/stream', text)
+        stream_first, stream_total, full = [], [], []
+        for text in texts:
+            first, total = timed_post(port, '/analyze/stream', text)
+            stream_first.append(first)
+            stream_total.append(total)
+            medintel.cache.clear()
+            full.append(timed_post(port, '/analyze', text)[1])
+    finally:
+        server.shutdown()
+
+    print(f"{'':<28} {'p50 ms':>8} {'p90 ms':>8}")
+    for name, values in (('stream: emergency level', stream_first),
+                         ('stream: complete', stream_total),
+                         ('/analyze (uncached)', full)):
+        print(f"{name:<28} {percentile(values, 0.5):>8.2f} {percentile(values, 0.9):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Symptom autocomplete benchmark
+
+Builds SymptomSuggester over the built-in knowledge base padded with
+synthetic synonyms and conditions, and reports build time, the number of
+trie nodes, the time of a direct lookup and of a full GET /symptoms/suggest
+through the Flask test client, for prefixes typed one keystroke at a time.
+
+Usage: python benchmarks/bench_suggest.py [--scales 1 10 100] [--queries N]
+"""
+
+import argparse
+import random
+import time
+
+from _common import make_document, synonym_phrases
+
+import app as medintel  # noqa: E402
+
+
+def keystrokes(document, count, rng):
+    """Prefixes of random phrases, as sent while typing them"""
+    phrases = synonym_phrases(document['symptom_synonyms'])
+    queries = []
+    while len(queries) < count:
+        phrase = rng.choice(phrases)
+        queries.extend(phrase[:i] for i in range(1, len(phrase) + 1))
+    return queries[:count]
+
+
+def per_query_us(func, queries, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            func(query)
+        best = min(best, (time.perf_counter() - start) / len(queries) * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help="synonym count multipliers")
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    client = medintel.app.test_client()
+    original = medintel.kb_manager.current
+    print(f"{'synonyms':>8} {'build ms':>9} {'nodes':>8} {'lookup us':>10} {'http us':>8}")
+    try:
+        for scale in args.scales:
+            rng = random.Random(f"42:{scale}")
+            document = make_document(original.knowledge_base.document, rng, synonym_scale=scale)
+            kb = medintel.KnowledgeBase(document=document)
+            start = time.perf_counter()
+            suggester = medintel.SymptomSuggester(kb)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            # Serve this knowledge base through the endpoint too
+            medintel.kb_manager.current = medintel.KnowledgeBundle(kb, original.symptom_processor, original.risk_engine)
+            medintel.symptom_suggester, medintel.suggester_version = suggester, kb.version
+
+            queries = keystrokes(document, args.queries, rng)
+            lookup = per_query_us(suggester.suggest, queries)
+            http = per_query_us(lambda q: client.get('/symptoms/suggest', query_string={'q': q}), queries[:500])
+            synonym_count = len(synonym_phrases(document['symptom_synonyms']))
+            print(f"{synonym_count:>8} {build_ms:>9.1f} {len(suggester.completions):>8} {lookup:>10.2f} {http:>8.1f}")
+    finally:
+        medintel.kb_manager.current = original
+        medintel._publish_symptom_suggester(original)
+
+
+if __name__ == '__main__':
+    main()
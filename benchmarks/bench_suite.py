@@ -0,0 +1,260 @@
+"""
+Per-stage benchmark suite with regression gating
+
+Generates reproducible synthetic workloads and times each stage of the
+analysis pipeline against them: input validation, symptom processing, risk
+scoring, insight generation, response encoding, the uncached pipeline end to
+end, and the /analyze handler through the Flask test client.
+
+Workloads are synthetic knowledge bases scaled from the built-in conditions
+up to tens of thousands of conditions, crossed with symptom texts of varying
+length and synonym density. Everything derives from --seed, so two runs with
+the same parameters see identical inputs.
+
+`run` writes results (throughput, p50 and p99 per stage and workload) to a
+JSON baseline. `compare` reruns the suite with the baseline's parameters and
+exits non-zero when any throughput drops, or any p99 rises, by more than
+--threshold. Record the baseline on the same, otherwise idle, machine the
+comparison will run on.
+
+Usage:
+    python benchmarks/bench_suite.py run -o baseline.json [--conditions 15 1000 20000]
+    python benchmarks/bench_suite.py compare baseline.json [--threshold 0.15]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+from _common import make_document, synonym_phrases
+
+# The handler benchmark sends far more requests than the default limit allows
+os.environ.setdefault('MEDINTEL_RATE_LIMIT_MAX_REQUESTS', '1000000000')
+os.environ.setdefault('MEDINTEL_KB_WATCH_INTERVAL', '0')
+
+import app as medintel  # noqa: E402
+
+STAGES = ['validate', 'process', 'score', 'insight', 'serialize', 'pipeline', 'analyze']
+
+# (name, target length in characters, fraction of words that are symptom phrases)
+TEXT_PROFILES = [
+    ('short-sparse', 60, 0.15),
+    ('short-dense', 60, 0.6),
+    ('long-sparse', 450, 0.15),
+    ('long-dense', 450, 0.6),
+]
+
+FILLER_WORDS = [
+    'i', 'have', 'been', 'feeling', 'since', 'yesterday', 'really', 'some', 'bad', 'the', 'and',
+    'with', 'after', 'lunch', 'morning', 'today', 'my', 'also', 'a', 'bit', 'of', 'it', 'started',
+    'week', 'night', 'worse', 'when', 'walking', 'now', 'again',
+]
+
+# =============================================================================
+# WORKLOADS
+# =============================================================================
+
+def make_texts(document, length, density, count, rng):
+    """Symptom descriptions mixing synonym phrases into filler words"""
+    phrases = synonym_phrases(document['symptom_synonyms'])
+    max_length = medintel.InputValidator.MAX_INPUT_LENGTH
+    texts = []
+    for _ in range(count):
+        words = []
+        size = 0
+        while size < length:
+            word = rng.choice(phrases) if rng.random() < density else rng.choice(FILLER_WORDS)
+            if size + len(word) + 1 > max_length:
+                break
+            words.append(word)
+            size += len(word) + 1
+        texts.append(' '.join(words))
+    return texts
+
+def make_bundle(document):
+    kb = medintel.KnowledgeBase(document=document)
+    return medintel.KnowledgeBundle(
+        kb, medintel.SymptomProcessor(kb), medintel.create_scoring_engine(medintel.app.config, kb)
+    )
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def measure(func, inputs, repeat, setup=None):
+    """Time one call per input over several passes and keep the best pass
+    
+    Like timeit, the best of several passes is reported, which filters out
+    interference from the rest of the machine. setup, when given, runs
+    untimed before the warm-up pass and before each timed pass.
+    """
+    if setup is not None:
+        setup()
+    for item in inputs:
+        func(item)
+    perf_counter = time.perf_counter
+    passes = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        latencies = []
+        for item in inputs:
+            start = perf_counter()
+            func(item)
+            latencies.append(perf_counter() - start)
+        latencies.sort()
+        passes.append((
+            len(latencies) / sum(latencies),
+            latencies[len(latencies) // 2],
+            latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)],
+        ))
+    return {
+        'ops_per_sec': round(max(p[0] for p in passes), 1),
+        'p50_us': round(min(p[1] for p in passes) * 1e6, 2),
+        'p99_us': round(min(p[2] for p in passes) * 1e6, 2),
+    }
+
+def bench_workload(bundle, texts, stages, repeat, client):
+    """Time every requested stage over one knowledge base and text profile"""
+    sanitized = [medintel.InputValidator.validate(t)[1] for t in texts]
+    processed = [bundle.symptom_processor.process(t) for t in sanitized]
+    conditions = bundle.knowledge_base.get_conditions()
+    scored = [(p, bundle.risk_engine.calculate(p['extracted_symptoms'], conditions, top_k=5)) for p in processed]
+    responses = [medintel.build_analysis(p, bundle) for p in processed]
+
+    def analyze(text):
+        response = client.post('/analyze', json={'symptoms': text})
+        if response.status_code != 200:
+            raise RuntimeError(f"/analyze returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    cases = {
+        'validate': (medintel.InputValidator.validate, texts),
+        'process': (bundle.symptom_processor.process, sanitized),
+        'score': (lambda p: bundle.risk_engine.calculate(p['extracted_symptoms'], conditions, top_k=5), processed),
+        'insight': (lambda item: medintel.insight_generator.generate(item[0], item[1], item[0]['emergency_level']), scored),
+        'serialize': (medintel.encode_response_template, responses),
+        'pipeline': (lambda p: medintel.encode_response_template(medintel.build_analysis(p, bundle)), processed),
+        'analyze': (analyze, texts),
+    }
+    results = {}
+    for stage in stages:
+        func, inputs = cases[stage]
+        # Each pass starts cold; repeated symptom sets within a pass still hit
+        setup = medintel.cache.clear if stage == 'analyze' else None
+        results[stage] = measure(func, inputs, repeat, setup)
+    return results
+
+def run_suite(params):
+    """Run every workload and return the results document"""
+    client = medintel.app.test_client()
+    original = medintel.kb_manager.current
+    results = {}
+    try:
+        for condition_count in params['conditions']:
+            rng = random.Random(f"{params['seed']}:{condition_count}")
+            document = make_document(medintel.knowledge_base.document, rng, condition_count)
+            bundle = make_bundle(document)
+            medintel.kb_manager.current = bundle
+            for name, length, density in TEXT_PROFILES:
+                texts = make_texts(document, length, density, params['texts'], rng)
+                stage_results = bench_workload(bundle, texts, params['stages'], params['repeat'], client)
+                for stage, result in stage_results.items():
+                    key = f"{stage}/kb={condition_count}/{name}"
+                    results[key] = result
+                    print(f"{key:<40} {result['ops_per_sec']:>12.1f} ops/s {result['p50_us']:>10.1f} us p50 "
+                          f"{result['p99_us']:>10.1f} us p99", file=sys.stderr)
+    finally:
+        medintel.kb_manager.current = original
+        medintel.cache.clear()
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'scoring_engine': medintel.app.config['SCORING_ENGINE'],
+        },
+        'params': params,
+        'results': results,
+    }
+
+# =============================================================================
+# COMPARISON
+# =============================================================================
+
+def compare(baseline, current, threshold):
+    """Print a comparison table and return the keys that regressed"""
+    regressions = []
+    print(f"{'benchmark':<40} {'ops/s':>10} {'change':>8} {'p99 us':>10} {'change':>8}")
+    for key, base in baseline['results'].items():
+        result = current['results'].get(key)
+        if result is None:
+            continue
+        throughput_change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+        p99_change = result['p99_us'] / base['p99_us'] - 1 if base['p99_us'] else 0
+        regressed = throughput_change < -threshold or p99_change > threshold
+        if regressed:
+            regressions.append(key)
+        print(f"{key:<40} {result['ops_per_sec']:>10.1f} {throughput_change:>+8.1%} "
+              f"{result['p99_us']:>10.1f} {p99_change:>+8.1%}{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the suite and write a baseline")
+    run_parser.add_argument('-o', '--output', default='-', help="results JSON file (default: stdout)")
+    run_parser.add_argument('--conditions', type=int, nargs='+', default=[15, 1000, 20000])
+    run_parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    run_parser.add_argument('--texts', type=int, default=200, help="texts per profile")
+    run_parser.add_argument('--repeat', type=int, default=5, help="timed passes per benchmark")
+    run_parser.add_argument('--seed', type=int, default=42)
+
+    compare_parser = commands.add_parser('compare', help="rerun with a baseline's parameters and gate on it")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('--threshold', type=float, default=0.15,
+                                help="allowed relative regression (default: 0.15)")
+    compare_parser.add_argument('-o', '--output', help="also write the new results here")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        params = {
+            'conditions': args.conditions,
+            'stages': args.stages,
+            'texts': args.texts,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        }
+        results = run_suite(params)
+        encoded = json.dumps(results, indent=2)
+        if args.output == '-':
+            print(encoded)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(encoded + "\n")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    current = run_suite(baseline['params'])
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(current, indent=2) + "\n")
+    if baseline['meta']['platform'] != current['meta']['platform']:
+        print(f"warning: baseline was recorded on {baseline['meta']['platform']}", file=sys.stderr)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Vectorized scoring benchmark
+
+Compares the inverted-index RiskScoringEngine with VectorizedRiskScoringEngine
+for single requests and for batches, at 15, 1k and 50k conditions. Results
+are checked for equality before timing, on the knowledge base as generated
+and again with fractional weights.
+
+Usage: python benchmarks/bench_vectorized_scoring.py
+"""
+
+import random
+import time
+
+import _common  # noqa: F401 - puts the repository root on sys.path
+
+from app import RiskScoringEngine, VectorizedRiskScoringEngine  # noqa: E402
+from bench_scoring import make_conditions  # noqa: E402
+
+CONDITION_COUNTS = [15, 1000, 50000]
+REQUEST_COUNT = 200
+TOP_K = 5
+
+
+def with_float_weights(conditions, rng):
+    """The same conditions with fractional symptom weights"""
+    return [dict(c, weights={s: round(rng.uniform(0.5, 10), 2) for s in c['symptoms']}) for c in conditions]
+
+
+def check_equal(conditions, requests):
+    """Assert both engines score every request identically"""
+    indexed = RiskScoringEngine()
+    indexed.index = indexed._get_index(conditions)
+    vectorized = VectorizedRiskScoringEngine()
+    vectorized.matrix = vectorized._get_matrix(conditions)
+    batch = vectorized.calculate_batch(requests, top_k=TOP_K)
+    for symptoms, result in zip(requests, batch):
+        assert result == indexed.calculate(symptoms, top_k=TOP_K)
+        assert result == vectorized.calculate(symptoms, top_k=TOP_K)
+        assert all(0 <= r['score'] <= 100 for r in result)
+
+
+def per_request_us(fn, requests):
+    start = time.perf_counter()
+    fn(requests)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'conditions':>10} {'build ms':>9} {'index us':>9} {'numpy us':>9} {'numpy batch us':>15}")
+    for count in CONDITION_COUNTS:
+        conditions, vocabulary = make_conditions(count, rng)
+        indexed = RiskScoringEngine()
+        indexed.index = indexed._get_index(conditions)
+        vectorized = VectorizedRiskScoringEngine()
+        start = time.perf_counter()
+        vectorized.matrix = vectorized._get_matrix(conditions)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        requests = [rng.sample(vocabulary[:200], rng.randint(1, 6)) for _ in range(REQUEST_COUNT)]
+        check_equal(conditions, requests)
+        check_equal(with_float_weights(conditions, rng), requests)
+
+        index_us = per_request_us(lambda rs: [indexed.calculate(s, top_k=TOP_K) for s in rs], requests)
+        numpy_us = per_request_us(lambda rs: [vectorized.calculate(s, top_k=TOP_K) for s in rs], requests)
+        batch_us = per_request_us(lambda rs: vectorized.calculate_batch(rs, top_k=TOP_K), requests)
+        print(f"{count:>10} {build_ms:>9.1f} {index_us:>9.1f} {numpy_us:>9.1f} {batch_us:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+MedIntel AI - Offline Bulk Scoring
+Re-scores symptom notes against the current knowledge base without HTTP
+
+Reads one note per line from a file or stdin, either as plain text or as
+NDJSON objects with a "symptoms" field (an optional "id" is passed through),
+and writes one NDJSON result per line. Work is fanned out to a process pool
+in chunks with a bounded number of chunks in flight, so memory stays constant
+however large the input is.
+
+Usage:
+    python bulk_score.py notes.txt -o results.ndjson --workers 8
+    cat notes.ndjson | python bulk_score.py - --format ndjson --unordered
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+import app as medintel
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+def parse_line(line_number, line, input_format):
+    """Validate a single input line
+    
+    Returns the result dict started for it, and the validated input, or None
+    when the result is already a complete error.
+    """
+    record_id = None
+    user_input = line.rstrip('\r\n')
+
+    if input_format == 'ndjson':
+        try:
+            record = json.loads(user_input)
+        except ValueError:
+            return {'line': line_number, 'success': False, 'error': 'Invalid JSON'}, None
+        if not isinstance(record, dict):
+            return {'line': line_number, 'success': False, 'error': 'Expected a JSON object'}, None
+        record_id = record.get('id')
+        user_input = record.get('symptoms')
+
+    result = {'line': line_number}
+    if record_id is not None:
+        result['id'] = record_id
+
+    is_valid, validated = medintel.InputValidator.validate(user_input)
+    if not is_valid:
+        result.update(success=False, error=validated)
+        return result, None
+    return result, validated
+
+def score_chunk(first_line, lines, input_format, include_insight, top_k):
+    """Score a chunk of lines and return them encoded as NDJSON
+    
+    The whole chunk is scored against one knowledge base bundle with a
+    single calculate_batch call.
+    """
+    bundle = medintel.kb_manager.current
+    results = []
+    pending = []
+    for offset, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            result, validated = parse_line(first_line + offset, line, input_format)
+            if validated is not None:
+                pending.append((result, bundle.symptom_processor.process(validated)))
+        except Exception as e:
+            result = {'line': first_line + offset, 'success': False, 'error': str(e)}
+        results.append(result)
+
+    risk_results = bundle.risk_engine.calculate_batch([processed['extracted_symptoms'] for _, processed in pending],
+                                                      bundle.knowledge_base.get_conditions(), top_k=top_k)
+    for (result, processed), scored in zip(pending, risk_results):
+        try:
+            analysis = medintel.build_analysis(processed, bundle, include_insight, top_k, risk_results=scored)
+        except Exception as e:
+            result.update(success=False, error=str(e))
+            continue
+        del analysis['disclaimer']
+        result['kb_version'] = bundle.knowledge_base.version
+        result.update(analysis)
+
+    out = [json.dumps(result, separators=(',', ':')) for result in results]
+    out.append('')
+    return '\n'.join(out)
+
+# =============================================================================
+# DRIVER
+# =============================================================================
+
+def read_chunks(stream, chunk_size):
+    """Yield (first line number, lines) lazily, one chunk at a time"""
+    line_number = 1
+    while True:
+        lines = list(islice(stream, chunk_size))
+        if not lines:
+            return
+        yield line_number, lines
+        line_number += len(lines)
+
+def run(args, stream, output):
+    """Score every line of stream, returning the number of lines written"""
+    task_args = (args.format, not args.no_insight, args.top_k)
+    written = 0
+    started = time.perf_counter()
+    last_report = started
+
+    def report(final=False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if final or (args.progress and now - last_report >= args.progress):
+            last_report = now
+            elapsed = max(now - started, 1e-9)
+            print(f"{written} lines in {elapsed:.1f}s ({written / elapsed:.0f} lines/s)", file=sys.stderr)
+
+    if args.workers == 0:
+        for first_line, lines in read_chunks(stream, args.chunk_size):
+            chunk = score_chunk(first_line, lines, *task_args)
+            output.write(chunk)
+            written += chunk.count('\n')
+            report()
+        report(final=True)
+        return written
+
+    max_in_flight = args.workers * 2
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.unordered:
+            pending = set()
+            for first_line, lines in read_chunks(stream, args.chunk_size):
+                pending.add(pool.submit(score_chunk, first_line, lines, *task_args))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        chunk = future.result()
+                        output.write(chunk)
+                        written += chunk.count('\n')
+                    report()
+            for future in pending:
+                chunk = future.result()
+                output.write(chunk)
+                written += chunk.count('\n')
+        else:
+            pending = deque()
+            for first_line, lines in read_chunks(stream, args.chunk_size):
+                pending.append(pool.submit(score_chunk, first_line, lines, *task_args))
+                if len(pending) >= max_in_flight:
+                    chunk = pending.popleft().result()
+                    output.write(chunk)
+                    written += chunk.count('\n')
+                    report()
+            while pending:
+                chunk = pending.popleft().result()
+                output.write(chunk)
+                written += chunk.count('\n')
+    report(final=True)
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score symptom notes against the current knowledge base.")
+    parser.add_argument('input', help="input file, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output NDJSON file (default: stdout)")
+    parser.add_argument('--format', choices=['text', 'ndjson'], default='text',
+                        help="one note per line, or NDJSON objects with a 'symptoms' field")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 scores inline (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="lines per task (default: 500)")
+    parser.add_argument('--unordered', action='store_true', help="write chunks as they finish")
+    parser.add_argument('--top-k', type=int, default=5, help="conditions per result (default: 5)")
+    parser.add_argument('--no-insight', action='store_true', help="omit the insight payload")
+    parser.add_argument('--progress', type=float, default=0, metavar='SECONDS',
+                        help="report throughput to stderr at this interval")
+    args = parser.parse_args(argv)
+
+    medintel.configure_logging(medintel.app.config)
+    stream = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        run(args, stream, output)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == '__main__':
+    main()
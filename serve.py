@@ -0,0 +1,233 @@
+"""
+MedIntel AI - Production Server
+Preforking launcher with a shared, preloaded knowledge base
+
+The parent process imports the application (building the knowledge base,
+symptom matcher and scoring tables), warms the hot paths, then calls
+gc.freeze() so those long-lived objects are never touched by the cyclic
+garbage collector and their pages stay shared copy-on-write after fork. Each
+worker process serves the shared listening socket with a fixed-size thread
+pool and runs its own warm-up before it starts accepting connections.
+
+Usage:
+    python serve.py --bind 0.0.0.0:5000 --workers 4 --threads 8
+
+Defaults come from SERVER_BIND, SERVER_WORKERS and SERVER_THREADS in the app
+config (MEDINTEL_* environment variables). SIGTERM/SIGINT stop the workers,
+KB_RELOAD_SIGNAL (SIGHUP by default) is forwarded to them to reload the
+knowledge base, and SIGHUP is otherwise ignored. Workers keep their
+metrics in files under METRICS_DIR (a temporary directory by default) so
+/metrics reports totals for all of them. With admission control enabled
+(ADMISSION_CONCURRENCY), each worker gets ADMISSION_QUEUE_SIZE extra threads
+to hold queued analyses, so requests wait in the priority queue rather than
+in the pool's first-come-first-served backlog.
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import app as medintel
+
+WARM_UP_INPUTS = [
+    "I have a fever and cough",
+    "chest pain, sweating and shortness of breath",
+    "runny nose, sneezing and congestion",
+    "severe headache with nausea",
+    "stomach ache and diarrhea",
+    "hello",
+]
+
+# =============================================================================
+# WORKER SERVER
+# =============================================================================
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without per-request access logging"""
+    def log_request(self, code='-', size='-'):
+        pass
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handing accepted connections to a fixed-size thread pool"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, **kwargs):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        super().__init__(host, port, app, **kwargs)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def warm_up():
+    """Exercise the request hot paths once so first requests pay no setup cost"""
+    for text in WARM_UP_INPUTS:
+        is_valid, result = medintel.InputValidator.validate(text)
+        if is_valid:
+            medintel.run_analysis(result, log=False)
+    with medintel.app.test_request_context('/'):
+        medintel.render_template('index.html')
+        medintel.render_template('privacy.html')
+        medintel.get_conditions()
+    # Warm-up traffic is not real traffic
+    medintel.metrics.reset()
+
+def run_worker(sock, threads, access_log):
+    """Serve the inherited listening socket until told to stop"""
+    host, port = sock.getsockname()[:2]
+    handler = WSGIRequestHandler if access_log else QuietRequestHandler
+    if medintel.admission.enabled:
+        threads += medintel.app.config['ADMISSION_QUEUE_SIZE']
+    server = PooledWSGIServer(host, port, medintel.app, threads, handler=handler, fd=sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so run it off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    medintel.start_kb_reloading(medintel.app.config)
+    warm_up()
+    server.serve_forever()
+    # Let in-flight requests finish before exiting
+    server.executor.shutdown(wait=True)
+
+# =============================================================================
+# SUPERVISOR
+# =============================================================================
+
+class Arbiter:
+    """Forks workers, restarts any that die, and forwards signals"""
+
+    def __init__(self, sock, workers, threads, access_log):
+        self.sock = sock
+        self.worker_count = workers
+        self.threads = threads
+        self.access_log = access_log
+        self.workers = set()
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                run_worker(self.sock, self.threads, self.access_log)
+                status = 0
+            except Exception:
+                medintel.logger.exception("Worker failed")
+            finally:
+                # os._exit skips atexit, so write out queued records first
+                try:
+                    if medintel.log_pipeline is not None:
+                        medintel.log_pipeline.stop()
+                finally:
+                    os._exit(status)
+        self.workers.add(pid)
+
+    def signal_workers(self, signum):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                self.workers.discard(pid)
+
+    def run(self):
+        def stop(signum, frame):
+            self.stopping = True
+            self.signal_workers(signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        # SIGHUP would otherwise kill every worker (they inherit the
+        # disposition) unless it is the signal they reload on
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        reload_signal = medintel.kb_reload_signal(medintel.app.config)
+        if reload_signal is not None:
+            signal.signal(reload_signal, lambda signum, frame: self.signal_workers(signum))
+
+        for _ in range(self.worker_count):
+            self.spawn()
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.workers.discard(pid)
+            if not self.stopping:
+                medintel.logger.warning("Worker %s exited with status %s, restarting", pid, status)
+                time.sleep(0.1)
+                self.spawn()
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+def main(argv=None):
+    config = medintel.app.config
+    parser = argparse.ArgumentParser(description="Run MedIntel AI with preforked workers.")
+    parser.add_argument('--bind', default=config['SERVER_BIND'], help="host:port to listen on")
+    parser.add_argument('--workers', type=int, default=config['SERVER_WORKERS'] or os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--threads', type=int, default=config['SERVER_THREADS'],
+                        help="request threads per worker")
+    parser.add_argument('--backlog', type=int, default=1024)
+    parser.add_argument('--access-log', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    medintel.configure_logging(config)
+    host, port = parse_bind(args.bind)
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+    # Every worker wakes for a new connection but only one accepts it; the
+    # others must get EAGAIN rather than block in accept(), where they could
+    # no longer notice a shutdown
+    sock.setblocking(False)
+
+    # Each worker writes its own metrics file here; /metrics sums them all
+    metrics_dir = config['METRICS_DIR'] or tempfile.mkdtemp(prefix='medintel-metrics-')
+    medintel.metrics.use_directory(metrics_dir, clear=True)
+
+    # Build and warm everything once, then keep it out of the collector's reach
+    warm_up()
+    gc.collect()
+    gc.freeze()
+
+    medintel.logger.info(
+        "Serving on %s:%s with %d workers x %d threads, knowledge base %s",
+        host, sock.getsockname()[1], args.workers, args.threads, medintel.kb_manager.current.knowledge_base.version
+    )
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        Arbiter(sock, args.workers, args.threads, args.access_log).run()
+    finally:
+        if not config['METRICS_DIR']:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -497,6 +497,58 @@ const AnalysisEngine = {
     }
 };
 
+// =============================================================================
+// Streaming Server Analysis (opt-in)
+// =============================================================================
+
+/**
+ * Runs the analysis on the server through /analyze/stream instead of the
+ * embedded engine. Enable with ?stream=1 or
+ * localStorage.setItem('medintel-streaming', 'true').
+ * Each stage is handed to onEvent(name, payload) as soon as it arrives, so
+ * an emergency can be shown before scoring and insights are done.
+ */
+const StreamingAnalysis = {
+    enabled: new URLSearchParams(window.location.search).has('stream') ||
+        localStorage.getItem('medintel-streaming') === 'true',
+
+    async analyze(symptoms, onEvent) {
+        const response = await fetch('/analyze/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
+            body: JSON.stringify({ symptoms })
+        });
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.error || `Analysis failed (${response.status})`);
+        }
+
+        const result = {};
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+            const { done, value } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (!line) continue;
+                const { event, ...payload } = JSON.parse(line);
+                if (event === 'error') throw new Error(payload.error);
+                Object.assign(result, payload);
+                onEvent(event, payload);
+            }
+            if (done) break;
+        }
+        if (!result.success) {
+            throw new Error('Analysis ended early');
+        }
+        return result;
+    }
+};
+
 // =============================================================================
 // State Management
 // =============================================================================
@@ -633,11 +685,15 @@ async function startAnalysis() {
     
     Elements.loadingSection.classList.add('active');
     
-    animateLoadingSteps();
-    
     try {
-        // Use local analysis engine instead of API
-        const data = AnalysisEngine.analyze(symptoms);
+        let data;
+        if (StreamingAnalysis.enabled) {
+            data = await StreamingAnalysis.analyze(symptoms, showStreamedStage);
+        } else {
+            animateLoadingSteps();
+            // Use local analysis engine instead of API
+            data = AnalysisEngine.analyze(symptoms);
+        }
         
         AppState.currentAnalysis = {
             id: Date.now(),
@@ -688,6 +744,27 @@ function animateLoadingSteps() {
     AppState.loadingInterval = setInterval(activateStep, 600);
 }
 
+const STREAM_STAGE_STEPS = { input_analysis: 2, risk_assessment: 3, insight: 4 };
+
+function showStreamedStage(event, payload) {
+    // Real progress replaces the timed animation
+    const completed = STREAM_STAGE_STEPS[event];
+    if (completed) {
+        Elements.loadingSteps.forEach((step, index) => {
+            step.classList.remove('active', 'completed');
+            if (index < completed) {
+                step.classList.add('completed');
+            } else if (index === completed) {
+                step.classList.add('active');
+            }
+        });
+    }
+    if (event === 'input_analysis' && payload.input_analysis.emergency_detected) {
+        Elements.emergencyAlert.classList.add('active');
+        Elements.emergencyAlert.scrollIntoView({ behavior: 'smooth', block: 'start' });
+    }
+}
+
 function resetLoadingSteps() {
     if (AppState.loadingInterval) {
         clearInterval(AppState.loadingInterval);